@@ -1,7 +1,20 @@
 import os
-import json
+import multiprocessing
+import orjson
 from outline_extractor import PDFOutlineExtractor
 
+def _process_one(args):
+    """Extract the outline of a single PDF (runs in a worker process)"""
+    pdf_path, output_path = args
+    
+    print(f"Processing {os.path.basename(pdf_path)}...")
+    
+    # Fresh extractor per worker call; avoids pickling one across processes
+    extractor = PDFOutlineExtractor()
+    result = extractor.extract_outline(pdf_path)
+    
+    return output_path, result
+
 def main():
     input_dir = "/app/input"
     output_dir = "/app/output"
@@ -9,25 +22,27 @@ def main():
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
     
-    extractor = PDFOutlineExtractor()
+    # Collect all PDF files in input directory
+    tasks = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith('.pdf'):
+                output_filename = os.path.splitext(entry.name)[0] + '.json'
+                output_path = os.path.join(output_dir, output_filename)
+                tasks.append((entry.path, output_path))
     
-    # Process all PDF files in input directory
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith('.pdf'):
-            pdf_path = os.path.join(input_dir, filename)
-            output_filename = filename.replace('.pdf', '.json')
-            output_path = os.path.join(output_dir, output_filename)
-            
-            print(f"Processing {filename}...")
-            
-            # Extract outline
-            result = extractor.extract_outline(pdf_path)
-            
+    if not tasks:
+        return
+    
+    # Extract outlines in parallel; results are written here in the parent
+    workers = min(os.cpu_count() or 1, 8, len(tasks))
+    with multiprocessing.Pool(workers) as pool:
+        for output_path, result in pool.imap_unordered(_process_one, tasks, chunksize=1):
             # Save result
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
             
-            print(f"Saved outline to {output_filename}")
+            print(f"Saved outline to {os.path.basename(output_path)}")
 
 if __name__ == "__main__":
     main()
@@ -1,20 +1,65 @@
 import fitz  # PyMuPDF
 import json
 import re
+import heapq
+from functools import lru_cache
 from collections import Counter, defaultdict
+from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
-import numpy as np
+
+# Common non-heading patterns, combined into one alternation
+_SKIP_COMBINED = re.compile(r'''
+    ^(?:
+        \d+$  # Just numbers
+      | page\s+\d+  # Page numbers
+      | \w{1,3}$  # Very short words
+      | [^\w\s]+$  # Only punctuation
+    )''', re.IGNORECASE | re.VERBOSE)
+
+_TRAIL_PUNCT = re.compile(r'[.,:;!?]+$')
+# Runs of whitespace and disallowed title characters, collapsed to one space
+_TITLE_SUB = re.compile(r'[^\w\-\:\.]+')
+_NUM_ONLY = re.compile(r'^\d+\.?\s*$')
+_STARTS_NUMDOT = re.compile(r'^\d+\.')
+
+# Text extraction flags: skip image blocks and ligature handling we never use
+_TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES & ~fitz.TEXT_PRESERVE_LIGATURES
+
+# Very common words that are false-positive headings on their own
+_STOPWORDS = frozenset({'and', 'or', 'the', 'of', 'in', 'on', 'at', 'to', 'for', 'with', 'by'})
+
+# Span flag bit set by PyMuPDF for bold text
+_FLAG_BOLD = 16
+
+# Heading levels implied by the numbered branches of the heading pattern
+_LEVEL_BY_GROUP = {'h1': "H1", 'h2': "H2", 'h3': "H3"}
+
+@dataclass
+class Line:
+    """A text line with the formatting used for title and heading detection"""
+    # Explicit slots (dataclass(slots=True) needs Python 3.10) keep the many
+    # per-line objects smaller than the dicts they replace
+    __slots__ = ('text', 'page', 'size', 'is_bold', 'bbox_y', 'font')
+    text: str
+    page: int
+    size: float
+    is_bold: bool
+    bbox_y: float
+    font: str
 
 class PDFOutlineExtractor:
     def __init__(self):
-        self.heading_patterns = [
-            r'^\d+\.\s+.+',  # 1. Chapter Title
-            r'^\d+\.\d+\s+.+',  # 1.1 Section Title
-            r'^\d+\.\d+\.\d+\s+.+',  # 1.1.1 Subsection Title
-            r'^Chapter\s+\d+.+',  # Chapter N Title
-            r'^Section\s+\d+.+',  # Section N Title
-            r'^Appendix\s+[A-Z].+',  # Appendix A Title
-        ]
+        # All heading patterns in one alternation; the matched branch
+        # name (m.lastgroup) tells which kind of heading it is
+        self._heading_alt = re.compile(r'''
+            ^(?:
+                (?P<h3>\d+\.\d+\.\d+\s+.+)  # 1.1.1 Subsection Title
+              | (?P<h2>\d+\.\d+\s+.+)  # 1.1 Section Title
+              | (?P<h1>\d+\.\s+.+)  # 1. Chapter Title
+              | (?P<chap>Chapter\s+\d+.+)  # Chapter N Title
+              | (?P<sec>Section\s+\d+.+)  # Section N Title
+              | (?P<app>Appendix\s+[A-Z].+)  # Appendix A Title
+            )''', re.IGNORECASE | re.VERBOSE)
         
         # Common heading keywords
         self.heading_keywords = [
@@ -22,90 +67,93 @@ class PDFOutlineExtractor:
             'conclusion', 'references', 'appendix', 'summary', 'abstract',
             'table of contents', 'revision history', 'glossary', 'index'
         ]
+        # Single-pass substring scan for any of the keywords
+        self._keyword_re = re.compile('|'.join(map(re.escape, self.heading_keywords)))
+        
+        # Per-instance memo of heading verdicts; repeated running headers and
+        # footers hit the cache instead of re-running the regex checks
+        self._heading_cache = lru_cache(maxsize=4096)(self._is_heading_impl)
     
-    def extract_text_with_formatting(self, pdf_path: str) -> List[Dict]:
+    def extract_text_with_formatting(self, pdf_path: str) -> List[Line]:
         """Extract text with detailed formatting information from PDF"""
-        doc = fitz.open(pdf_path)
         formatted_text = []
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            blocks = page.get_text("dict")
-            
-            for block in blocks["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
+        # Close the document (and free its pages) as soon as extraction ends
+        with fitz.open(pdf_path) as doc:
+            for page_num, page in enumerate(doc, start=1):
+                blocks = page.get_text("dict", flags=_TEXT_FLAGS)
+                
+                for block in blocks["blocks"]:
+                    for line in block.get("lines", ()):
                         # Combine all spans in a line to form complete text
-                        line_text = ""
-                        line_fonts = []
-                        line_sizes = []
-                        line_flags = []
+                        text_parts = []
+                        font_counter = Counter()
+                        size_sum = 0.0
+                        size_n = 0
+                        flags_or = 0
                         
                         for span in line["spans"]:
                             text = span["text"].strip()
                             if text:
-                                line_text += text + " "
-                                line_fonts.append(span["font"])
-                                line_sizes.append(span["size"])
-                                line_flags.append(span["flags"])
+                                text_parts.append(text)
+                                font_counter[span["font"]] += 1
+                                size_sum += span["size"]
+                                size_n += 1
+                                flags_or |= span["flags"]
                         
-                        line_text = line_text.strip()
+                        line_text = " ".join(text_parts)
                         if line_text and len(line_text) > 2:
                             # Use dominant formatting for the line
-                            avg_size = np.mean(line_sizes) if line_sizes else 12
-                            dominant_font = max(set(line_fonts), key=line_fonts.count) if line_fonts else ""
-                            is_bold = any(flag & 2**4 for flag in line_flags)
+                            avg_size = (size_sum / size_n) if size_n else 12.0
+                            dominant_font = font_counter.most_common(1)[0][0] if font_counter else ""
+                            is_bold = (flags_or & _FLAG_BOLD) != 0
                             
-                            formatted_text.append({
-                                "text": line_text,
-                                "page": page_num + 1,
-                                "font": dominant_font,
-                                "size": avg_size,
-                                "is_bold": is_bold,
-                                "bbox": line["bbox"],
-                                "line_count": len(line_text.split())
-                            })
-        
-        doc.close()
+                            formatted_text.append(Line(
+                                text=line_text,
+                                page=page_num,
+                                size=avg_size,
+                                is_bold=is_bold,
+                                bbox_y=line["bbox"][1],
+                                font=dominant_font
+                            ))
+        
         return formatted_text
     
-    def identify_title(self, formatted_text: List[Dict]) -> str:
+    def identify_title(self, formatted_text: List[Line]) -> str:
         """Identify document title from first page with improved logic"""
-        first_page_text = [item for item in formatted_text if item["page"] == 1]
+        first_page_text = [item for item in formatted_text if item.page == 1]
         
         if not first_page_text:
             return "Untitled Document"
         
-        # Sort by font size and position (larger fonts and higher position first)
-        first_page_text.sort(key=lambda x: (-x["size"], x["bbox"][1]))
+        # Top 10 items by font size and position (larger fonts and higher position first)
+        top_items = heapq.nsmallest(10, first_page_text, key=lambda x: (-x.size, x.bbox_y))
         
         # Look for the title in the top portion of the first page
         candidates = []
         
-        for item in first_page_text[:10]:  # Check top 10 items
-            text = item["text"].strip()
+        for item in top_items:
+            text = item.text.strip()
             
             # Filter criteria for title
             if (20 <= len(text) <= 200 and  # Reasonable title length
-                item["size"] >= 14 and  # Reasonable font size for title
-                not re.match(r'^\d+\.?\s*$', text) and  # Not just numbers
+                item.size >= 14 and  # Reasonable font size for title
+                not _NUM_ONLY.match(text) and  # Not just numbers
                 not text.lower().startswith('page') and  # Not page numbers
                 len(text.split()) >= 2):  # At least 2 words
                 
-                candidates.append((text, item["size"]))
+                candidates.append((text, item.size))
         
         if candidates:
             # Return the largest text that meets criteria
             title = max(candidates, key=lambda x: x[1])[0]
             # Clean the title
-            title = re.sub(r'[^\w\s\-\:\.]', ' ', title)
-            title = ' '.join(title.split())
-            return title
+            return _TITLE_SUB.sub(' ', title).strip()
         
         # Fallback: combine first few meaningful texts
         meaningful_texts = []
-        for item in first_page_text[:5]:
-            text = item["text"].strip()
+        for item in top_items[:5]:
+            text = item.text.strip()
             if len(text) > 5 and len(text.split()) >= 2:
                 meaningful_texts.append(text)
         
@@ -116,17 +164,16 @@ class PDFOutlineExtractor:
         
         return "Untitled Document"
     
-    def analyze_document_structure(self, formatted_text: List[Dict]) -> Dict:
+    def analyze_document_structure(self, formatted_text: List[Line]) -> Dict:
         """Analyze the document to understand its structure"""
-        # Analyze font sizes
-        sizes = [item["size"] for item in formatted_text]
-        size_counter = Counter(sizes)
+        # Analyze font sizes in a single pass
+        size_counter = Counter(item.size for item in formatted_text)
         
         # Get the most common font size (likely body text)
         body_text_size = size_counter.most_common(1)[0][0]
         
-        # Calculate size thresholds
-        all_sizes = sorted(set(sizes), reverse=True)
+        # Calculate size thresholds; the counter keys are the distinct sizes
+        all_sizes = sorted(size_counter, reverse=True)
         size_thresholds = {
             'h1': body_text_size * 1.5,
             'h2': body_text_size * 1.3,
@@ -139,82 +186,90 @@ class PDFOutlineExtractor:
             'all_sizes': all_sizes
         }
     
-    def is_likely_heading(self, item: Dict, structure_info: Dict) -> bool:
-        """Determine if text item is likely a heading with improved logic"""
-        text = item["text"].strip()
-        
+    def is_likely_heading(self, item: Line, structure_info: Dict) -> Tuple[bool, Optional[str]]:
+        """Determine if text item is likely a heading, plus the level implied by its numbering (or None)"""
+        return self._heading_cache(
+            item.text.strip(),
+            item.size,
+            item.is_bold,
+            structure_info['size_thresholds']['h3'],
+            structure_info['body_text_size']
+        )
+    
+    def _is_heading_impl(self, text: str, size: float, is_bold: bool,
+                         h3_threshold: float, body_text_size: float) -> Tuple[bool, Optional[str]]:
+        """Heading verdict as a pure function of the text and its formatting"""
         # Basic filters
         if len(text) < 3 or len(text) > 300:
-            return False
+            return False, None
         
         # Skip if too many words (likely paragraph)
-        if len(text.split()) > 20:
-            return False
+        word_count = len(text.split())
+        if word_count > 20:
+            return False, None
         
         # Skip common non-heading patterns
-        skip_patterns = [
-            r'^\d+$',  # Just numbers
-            r'^page\s+\d+',  # Page numbers
-            r'^\w{1,3}$',  # Very short words
-            r'^[^\w\s]+$',  # Only punctuation
-        ]
+        if _SKIP_COMBINED.match(text):
+            return False, None
         
-        for pattern in skip_patterns:
-            if re.match(pattern, text, re.IGNORECASE):
-                return False
+        # Positive indicators; need at least 3 to be considered a heading.
+        # Checks run most decisive first and stop once the threshold is reached
+        
+        # 1. Numbered section patterns (worth 3 on their own)
+        m = self._heading_alt.match(text)
+        if m:
+            return True, _LEVEL_BY_GROUP.get(m.lastgroup)
         
-        # Positive indicators
         indicators = 0
         
-        # 1. Font size indicator
-        if item["size"] > structure_info['size_thresholds']['h3']:
+        # 2. Font size indicator
+        if size > h3_threshold:
             indicators += 2
-        elif item["size"] > structure_info['body_text_size']:
+        elif size > body_text_size:
             indicators += 1
         
-        # 2. Bold formatting
-        if item["is_bold"]:
+        # 3. Bold formatting
+        if is_bold:
             indicators += 2
+        if indicators >= 3:
+            return True, None
+        
+        # 4. Short, meaningful text
+        if 5 <= len(text) <= 100 and word_count <= 10:
+            indicators += 1
+        if indicators >= 3:
+            return True, None
         
-        # 3. Numbered section patterns
-        for pattern in self.heading_patterns:
-            if re.match(pattern, text, re.IGNORECASE):
-                indicators += 3
-                break
-        
-        # 4. Contains heading keywords
-        text_lower = text.lower()
-        for keyword in self.heading_keywords:
-            if keyword in text_lower:
-                indicators += 1
-                break
-        
-        # 5. Title case or all caps (but not too long)
-        if text.istitle() and len(text.split()) <= 8:
+        # 5. Title case or all caps (but not too long); the length checks go
+        # first so the string is only scanned for case when it can count
+        if word_count <= 8 and text.istitle():
             indicators += 1
-        elif text.isupper() and 5 <= len(text) <= 50:
+        elif 5 <= len(text) <= 50 and text.isupper():
             indicators += 2
+        if indicators >= 3:
+            return True, None
         
-        # 6. Short, meaningful text
-        if 5 <= len(text) <= 100 and len(text.split()) <= 10:
+        # 6. Contains heading keywords
+        if self._keyword_re.search(text.lower()):
             indicators += 1
         
-        # Need at least 3 indicators to be considered a heading
-        return indicators >= 3
+        return indicators >= 3, None
     
-    def determine_heading_level(self, item: Dict, structure_info: Dict) -> str:
+    def determine_heading_level(self, item: Line, structure_info: Dict,
+                                hint: Optional[str] = None) -> str:
         """Determine heading level with improved logic"""
-        text = item["text"].strip()
-        size = item["size"]
+        # Level already known from the numbered pattern matched by is_likely_heading
+        if hint is not None:
+            return hint
+        
+        text = item.text.strip()
+        size = item.size
         thresholds = structure_info['size_thresholds']
         
         # Pattern-based level determination (highest priority)
-        if re.match(r'^\d+\.\s+', text):
-            return "H1"
-        elif re.match(r'^\d+\.\d+\s+', text):
-            return "H2"
-        elif re.match(r'^\d+\.\d+\.\d+\s+', text):
-            return "H3"
+        m = self._heading_alt.match(text)
+        if m and m.lastgroup in _LEVEL_BY_GROUP:
+            return _LEVEL_BY_GROUP[m.lastgroup]
         
         # Size-based level determination
         if size >= thresholds['h1']:
@@ -226,61 +281,58 @@ class PDFOutlineExtractor:
     
     def clean_heading_text(self, text: str) -> str:
         """Clean and normalize heading text"""
+        return self._clean_heading_text(text)
+    
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def _clean_heading_text(text: str) -> str:
+        """Cached implementation of clean_heading_text (a pure function of text)"""
         # Remove extra whitespace
         text = ' '.join(text.split())
         
         # Remove trailing punctuation except periods in numbered sections
-        if not re.match(r'^\d+\.', text):
-            text = re.sub(r'[.,:;!?]+$', '', text)
+        if not _STARTS_NUMDOT.match(text):
+            text = _TRAIL_PUNCT.sub('', text)
         
         # Remove leading/trailing quotes
         text = text.strip('"\'')
         
         return text
     
-    def filter_and_deduplicate_headings(self, headings: List[Dict]) -> List[Dict]:
-        """Filter out false positives and remove duplicates"""
-        filtered_headings = []
+    def classify_headings(self, formatted_text: List[Line]) -> List[Dict]:
+        """Main heading classification with improved algorithm"""
+        structure_info = self.analyze_document_structure(formatted_text)
+        final_headings = []
         seen_texts = set()
         
-        for heading in headings:
-            text = heading["text"].lower().strip()
+        for item in formatted_text:
+            is_heading, hint = self.is_likely_heading(item, structure_info)
+            if not is_heading:
+                continue
             
-            # Skip very common false positives
-            if text in {'and', 'or', 'the', 'of', 'in', 'on', 'at', 'to', 'for', 'with', 'by'}:
+            clean_text = self.clean_heading_text(item.text)
+            if not clean_text:  # Only add if text remains after cleaning
                 continue
             
-            # Skip duplicates
-            if text in seen_texts:
+            # Filter out very common false positives and duplicates
+            key = clean_text.lower().strip()
+            if key in _STOPWORDS or key in seen_texts:
                 continue
+            seen_texts.add(key)
             
-            seen_texts.add(text)
-            filtered_headings.append(heading)
-        
-        return filtered_headings
-    
-    def classify_headings(self, formatted_text: List[Dict]) -> List[Dict]:
-        """Main heading classification with improved algorithm"""
-        structure_info = self.analyze_document_structure(formatted_text)
-        potential_headings = []
-        
-        for item in formatted_text:
-            if self.is_likely_heading(item, structure_info):
-                level = self.determine_heading_level(item, structure_info)
-                clean_text = self.clean_heading_text(item["text"])
-                
-                if clean_text:  # Only add if text remains after cleaning
-                    potential_headings.append({
-                        "level": level,
-                        "text": clean_text,
-                        "page": item["page"]
-                    })
-        
-        # Filter and deduplicate
-        final_headings = self.filter_and_deduplicate_headings(potential_headings)
-        
-        # Sort by page and appearance order
-        final_headings.sort(key=lambda x: (x["page"], x["text"]))
+            final_headings.append({
+                "level": self.determine_heading_level(item, structure_info, hint=hint),
+                "text": clean_text,
+                "page": item.page,
+                "bbox_y": item.bbox_y
+            })
+        
+        # Sort by page and vertical position (reading order)
+        final_headings.sort(key=lambda x: (x["page"], x["bbox_y"]))
+        
+        # The position was only needed for ordering; keep the output schema
+        for heading in final_headings:
+            del heading["bbox_y"]
         
         return final_headings
     